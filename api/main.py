@@ -1,20 +1,29 @@
 # Util imports
 import os
+import re
+import secrets
+from contextlib import asynccontextmanager
+from typing import Final
 from dotenv import load_dotenv
 import logging
 
 # FastAPI imports
-from fastapi import FastAPI, APIRouter, Depends, HTTPException
+from fastapi import FastAPI, APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 import uvicorn
 
 # Intergration imports
 #import stripe
-from supabase import create_client, Client
+from supabase import AsyncClient
+from pydantic import TypeAdapter
 
 # Custom imports
-from ios.io_db import NewsletterSubscriber, EmailVerificationRequest, EmailVerificationResponse, insert_newsletter_subscriber, verify_newsletter_subscriber
-from email_serv.email_processor import send_confirmation_email
+from ios.io_db import NewsletterSubscriber, NewsletterBatchResult, EmailVerificationRequest, EmailVerificationResponse, insert_newsletter_subscriber, insert_newsletter_subscribers, verify_newsletter_subscriber
+from ios.supabase_client import create_supabase, close_supabase
+from ios.cache import is_email_verified, mark_email_verified, open_cache, close_cache
+from email_serv.email_processor import send_confirmation_email, open_email_client, close_email_client
 
 
 logger = logging.getLogger('uvicorn.error')
@@ -23,13 +32,30 @@ logger.setLevel(logging.DEBUG)
 # Load environment variables from .env file
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    App startup and shutdown
+    """
+    # One Supabase client per worker, shared by every request
+    app.state.supabase = await create_supabase()
+    open_email_client()
+    open_cache()
+    yield
+    # Close pooled connections on shutdown
+    await close_email_client()
+    await close_cache()
+    await close_supabase(app.state.supabase)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Nappio API",
     description="Backend API for Nappio newsletter service",
     version="1.0.0",
     docs_url="/docs",    # Swagger UI at /docs
-    redoc_url="/redoc"   # ReDoc at /redoc
+    redoc_url="/redoc",  # ReDoc at /redoc
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Create APIRouter instance
@@ -38,34 +64,40 @@ router = APIRouter(
     tags=["newsletter"]
 
 )
-# Frontend URL
-FRONTEND_URL = os.environ.get('FRONTEND_URL')
+# Frontend URL, normalised to a single trailing slash
+if not os.environ.get('FRONTEND_URL'):
+    raise ValueError("FRONTEND_URL is not set in the environment variables.")
+FRONTEND_URL: Final[str] = os.environ['FRONTEND_URL'].rstrip('/') + '/'
+
+# Maximum number of subscribers accepted by the batch subscribe route
+MAX_BATCH_SUBSCRIBERS = 500
+
+# Admin key for the batch subscribe route, which rejects every request when it is not set
+ADMIN_API_KEY: Final[str] = os.environ.get('ADMIN_API_KEY', '')
+
+# Serialises subscriber responses straight to JSON in pydantic-core
+SUBSCRIBER_ADAPTER = TypeAdapter(NewsletterSubscriber)
 
 # Configure CORS
-origins = [
-    # Dev URLS
-    "http://localhost",
-    "http://localhost:3000",
-    "http://localhost:5173",    
-    # inject frontend URL from environment variable
-    FRONTEND_URL,
-]
+# Dev URLs on any localhost port, plus the frontend URL from the environment
+CORS_ORIGIN_REGEX: Final[str] = os.environ.get(
+    'CORS_ORIGIN_REGEX',
+    rf"^(http://localhost(:\d+)?|{re.escape(FRONTEND_URL.rstrip('/'))})$"
+)
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=origins,
+    allow_origin_regex=CORS_ORIGIN_REGEX,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+# Compress larger JSON responses, e.g. batch subscribe results
+app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=5)
 
 
 
-# Supabase configuration
-SUPABASE_URL: str = os.environ.get('SUPABASE_URL')
-SUPABASE_KEY: str = os.environ.get('SUPABASE_KEY')
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 # Stripe configuration
 #stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
@@ -82,59 +114,129 @@ async def root():
         "version": "1.0.0"
     }
 
+def get_supabase(request: Request) -> AsyncClient:
+    """
+    Supabase client created on startup
+    """
+    return request.app.state.supabase
+
+def require_admin_key(x_admin_key: str = Header("")):
+    """
+    Reject requests that do not carry the admin API key
+    """
+    if not ADMIN_API_KEY or not secrets.compare_digest(x_admin_key.encode(), ADMIN_API_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+def build_confirmation_link(email: str) -> str:
+    """
+    Build the frontend link a subscriber follows to confirm their email
+    """
+    return f"{FRONTEND_URL}confirm-email?email={email}"
+
 # Newsletter routes
 @router.post("/newsletter/subscribe", response_model=NewsletterSubscriber)
-def subscribe_to_newsletter(subscriber: NewsletterSubscriber):
+async def subscribe_to_newsletter(
+    subscriber: NewsletterSubscriber,
+    background_tasks: BackgroundTasks,
+    supabase: AsyncClient = Depends(get_supabase)
+):
     """
     Handle newsletter subscription requests
     """
     try:
-        logger.debug(f'Received subscriber data: {subscriber.model_dump()}')
+        logger.debug("Received subscriber data: %s", subscriber)
         
-        # Insert subscriber into the database
-        result = insert_newsletter_subscriber(supabase, subscriber)
+        # Insert subscriber into the database, existing emails are skipped
+        result = await insert_newsletter_subscriber(supabase, subscriber)
         if not result:
-            logger.error("subscribe_to_newsletter(): Failed to subscribe")
-            raise HTTPException(status_code=400, detail="Failed to subscribe")
+            logger.error("subscribe_to_newsletter(): Email already subscribed")
+            raise HTTPException(status_code=400, detail="Email already subscribed")
         
         # Generate a confirmation link
-        #TODO: this causes a double forward slash in the URL, fix it
-        confirmation_link = f"{FRONTEND_URL}confirm-email?email={subscriber.email}"
-        logger.debug(f"Generated confirmation link: {confirmation_link}")
+        confirmation_link = build_confirmation_link(subscriber.email)
+        logger.debug("Generated confirmation link: %s", confirmation_link)
         
-        # Send confirmation email
-        email_response = send_confirmation_email(
+        # Send confirmation email once the response has been sent
+        background_tasks.add_task(
+            send_confirmation_email,
             to_email=subscriber.email,
             first_name=subscriber.first_name,
             confirmation_link=confirmation_link
         )
         
-        if email_response.get("status") != 200:
-            logger.warning(f"subscribe_to_newsletter(): Failed to send confirmation email to {subscriber.email}")
+        return Response(
+            content=SUBSCRIBER_ADAPTER.dump_json(SUBSCRIBER_ADAPTER.validate_python(result)),
+            media_type="application/json"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("subscribe_to_newsletter(): Error subscribing to newsletter: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/newsletter/subscribe/batch", response_model=list[NewsletterBatchResult], dependencies=[Depends(require_admin_key)])
+async def subscribe_to_newsletter_batch(
+    subscribers: list[NewsletterSubscriber],
+    background_tasks: BackgroundTasks,
+    supabase: AsyncClient = Depends(get_supabase)
+):
+    """
+    Handle bulk newsletter subscription requests, e.g. a CSV import, admin only
+    """
+    if len(subscribers) > MAX_BATCH_SUBSCRIBERS:
+        raise HTTPException(status_code=413, detail=f"A batch can contain at most {MAX_BATCH_SUBSCRIBERS} subscribers")
+    
+    try:
+        logger.debug("Received batch of %d subscribers", len(subscribers))
+        
+        # Repeated emails in the batch are subscribed once
+        unique_subscribers = {}
+        for subscriber in subscribers:
+            unique_subscribers.setdefault(subscriber.email, subscriber)
+        
+        # Insert all subscribers with a single database request, skipping existing emails
+        results = await insert_newsletter_subscribers(supabase, list(unique_subscribers.values()))
+        inserted = {row["email"]: row for row in results}
         
-        return result
+        # Send confirmation emails to new subscribers once the response has been sent
+        for row in results:
+            background_tasks.add_task(
+                send_confirmation_email,
+                to_email=row["email"],
+                first_name=row["first_name"],
+                confirmation_link=build_confirmation_link(row["email"])
+            )
+        
+        return [
+            {"id": inserted[email]["id"], "email": email, "status": "subscribed"} if email in inserted
+            else {"email": email, "status": "already_subscribed"}
+            for email in unique_subscribers
+        ]
     except Exception as e:
-        if "duplicate key" in str(e).lower():
-            logger.error("subscribe_to_newsletter(): Email already subscribed")
-            raise HTTPException(status_code=400, detail="Email already subscribed")
-        logger.exception(f"subscribe_to_newsletter(): Error subscribing to newsletter: {str(e)}")
+        logger.exception("subscribe_to_newsletter_batch(): Error subscribing batch to newsletter: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/newsletter/verify", response_model=EmailVerificationResponse)
-def verify_subscriber_email(request: EmailVerificationRequest):
+async def verify_subscriber_email(request: EmailVerificationRequest, supabase: AsyncClient = Depends(get_supabase)):
     """
     Handle email verification requests
     """
     try:
         email = request.email
-        logger.debug(f"Received email verification request for: {email}")
-        verified = verify_newsletter_subscriber(supabase, request)
+        logger.debug("Received email verification request for: %s", email)
+        
+        # Repeat clicks on the confirmation link are answered from the cache
+        if await is_email_verified(email):
+            return {"message": f"Email {email} verified successfully."}
+        
+        verified = await verify_newsletter_subscriber(supabase, request)
         if verified:
+            await mark_email_verified(email)
             return {"message": f"Email {email} verified successfully."}
         else:
             raise HTTPException(status_code=404, detail="Subscriber not found")
     except Exception as e:
-        logger.exception(f"verify_subscriber_email(): Error verifying email {email}: {str(e)}")
+        logger.exception("verify_subscriber_email(): Error verifying email %s: %s", email, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # Include router in app
@@ -142,4 +244,13 @@ app.include_router(router)
 
 # Run the app
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(
+        "api.main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="auto",  # uvloop when installed, it is not available on Windows
+        http="httptools",
+        workers=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        limit_concurrency=1000,
+        timeout_keep_alive=30
+    )
\ No newline at end of file
@@ -1,7 +1,11 @@
 import os
+import asyncio
 import logging
+from typing import Optional
+from aiolimiter import AsyncLimiter
 from dotenv import load_dotenv
-from mailersend import emails
+import httpx
+from email_serv.template_env import load_environment
 
 logger = logging.getLogger('uvicorn.error')
 logger.setLevel(logging.DEBUG)
@@ -16,82 +20,105 @@ SERVICE_NAME = os.environ.get("SERVICE_NAME", "Nappio")
 if not EMAIL_API_TOKEN:
     raise ValueError("SENDER_API_TOKEN is not set in the environment variables.")
 
-def send_confirmation_email(to_email: str, first_name: str, confirmation_link: str):
+# MailerSend API
+MAILERSEND_EMAIL_URL = "https://api.mailersend.com/v1/email"
+
+# Outbound limits per worker, so bursts of sends (e.g. batch subscribes)
+# stay under MailerSend's rate limits instead of failing with 429s
+EMAIL_RATE_LIMIT = int(os.environ.get("EMAIL_RATE_LIMIT", "10"))  # sends per second
+EMAIL_MAX_CONCURRENCY = 5
+
+# Shared HTTP client, so TLS connections to MailerSend are kept alive between sends,
+# and the send limits. Created on app startup, so every lifespan gets fresh ones.
+_client: Optional[httpx.AsyncClient] = None
+_limiter: Optional[AsyncLimiter] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+# Static sender and reply-to details, shared by every email
+MAIL_FROM = {
+    "name": SERVICE_NAME,
+    "email": "info@nappio.co.uk"
+}
+REPLY_TO = [
+    {
+        "name": "Nappio Info",
+        "email": "info@nappio.co.uk"
+    }
+]
+
+# Email templates (HTML and plain text), loaded once at import
+_env = load_environment()
+CONFIRMATION_SUBJECT = f"Confirm your email for {SERVICE_NAME}"
+CONFIRMATION_HTML = _env.get_template("confirmation.html.jinja")
+CONFIRMATION_TEXT = _env.get_template("confirmation.txt.jinja")
+
+def open_email_client():
+    """
+    Create the shared MailerSend HTTP client and send limits, called on app startup.
+    """
+    global _client, _limiter, _semaphore
+    _client = httpx.AsyncClient(
+        timeout=10,
+        limits=httpx.Limits(max_keepalive_connections=20),
+        headers={"Authorization": f"Bearer {EMAIL_API_TOKEN}"},
+    )
+    _limiter = AsyncLimiter(EMAIL_RATE_LIMIT, 1)
+    _semaphore = asyncio.Semaphore(EMAIL_MAX_CONCURRENCY)
+
+async def close_email_client():
+    """
+    Close the shared MailerSend HTTP client, called on app shutdown.
+    """
+    await _client.aclose()
+
+async def send_confirmation_email(to_email: str, first_name: str, confirmation_link: str):
     """
     Send a confirmation email to the specified recipient using MailerSend.
     """
-    logger.info(f"Sending confirmation email to {to_email}")
-    
+    logger.info("Sending confirmation email to %s", to_email)
+
     try:
-        # Initialize MailerSend email client
-        mailer = emails.NewEmail(EMAIL_API_TOKEN)
-        
+        # Fill in the email content (HTML and plain text)
+        html_content = CONFIRMATION_HTML.render(
+            first_name=first_name,
+            confirmation_link=confirmation_link,
+            service_name=SERVICE_NAME
+        )
+        plaintext_content = CONFIRMATION_TEXT.render(
+            first_name=first_name,
+            confirmation_link=confirmation_link,
+            service_name=SERVICE_NAME
+        )
+
         # Define the email body
-        mail_body = {}
-        
-        # Set sender details
-        mail_from = {
-            "name": SERVICE_NAME,
-            "email": "info@nappio.co.uk"
+        mail_body = {
+            "from": MAIL_FROM,
+            # Recipient details
+            "to": [
+                {
+                    "name": first_name,
+                    "email": to_email
+                }
+            ],
+            "subject": CONFIRMATION_SUBJECT,
+            "html": html_content,
+            "text": plaintext_content,
+            "reply_to": REPLY_TO,
         }
-        mailer.set_mail_from(mail_from, mail_body)
-        
-        # Set recipient details
-        recipients = [
-            {
-                "name": first_name,
-                "email": to_email
-            }
-        ]
-        mailer.set_mail_to(recipients, mail_body)
-        
-        # Set email subject
-        mailer.set_subject(f"Confirm your email for {SERVICE_NAME}", mail_body)
-        
-        # Set email content (HTML and plain text)
-        html_content = f"""
-        <p>Hi {first_name},</p>
-        <p>Thank you for signing up! Please confirm your email by clicking the link below:</p>
-        <p><a href="{confirmation_link}">Confirm Email</a></p>
-        <p>If you didn't sign up, you can ignore this email.</p>
-        <p>Best,<br>The {SERVICE_NAME} Team</p>
-        """
-        plaintext_content = f"""
-        Hi {first_name},
-        
-        Thank you for signing up! Please confirm your email by clicking the link below:
-        {confirmation_link}
-        
-        If you didn't sign up, you can ignore this email.
-        
-        Best,
-        The {SERVICE_NAME} Team
-        """
-        mailer.set_html_content(html_content, mail_body)
-        mailer.set_plaintext_content(plaintext_content, mail_body)
-        
-        # Optionally, set reply-to address
-        reply_to = [
-            {
-                "name": "Nappio Info",
-                "email": "info@nappio.co.uk"
-            }
-        ]
-        mailer.set_reply_to(reply_to, mail_body)
-        
+
         # Send the email
-        response = mailer.send(mail_body)
-        
-        # Check the response status
-        #TODO: hardcoded response, should be done better
-        if response.strip() != '202':
-            logger.error(f"Failed to send email to {to_email}. response: {response}, response type: {type(response)}")
-            return {"response": response}
-        
+        async with _semaphore, _limiter:
+            response = await _client.post(MAILERSEND_EMAIL_URL, json=mail_body)
+
+        # MailerSend accepts the email for delivery with a 202
+        if response.status_code != 202:
+            logger.error("Failed to send email to %s. status: %s, response: %s", to_email, response.status_code, response.text)
+            return {"status": response.status_code, "response": response.text}
+
         # Log and return the success response
-        logger.info(f"Email sent successfully to {to_email}\nresponse: {response}")
-        return {"status": 200, "response": response}
-    
+        logger.debug("Email sent successfully to %s", to_email)
+        return {"status": response.status_code}
+
     except Exception as e:
-        logger.exception(f"Failed to send email to {to_email}: {str(e)}")
-        return {"status": 500, "error": str(e)}
\ No newline at end of file
+        logger.exception("Failed to send email to %s: %s", to_email, e)
+        return {"status": 500, "error": str(e)}
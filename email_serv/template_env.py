@@ -0,0 +1,37 @@
+import os
+from jinja2 import BaseLoader, Environment, FileSystemLoader, ModuleLoader, select_autoescape
+
+# Template sources, and the Python modules they are compiled to at build time
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
+COMPILED_TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "compiled_templates")
+
+def create_environment(loader: BaseLoader) -> Environment:
+    """
+    Build a Jinja environment for email templates.
+    HTML templates are autoescaped so user input such as first names is safe.
+    """
+    return Environment(
+        loader=loader,
+        autoescape=select_autoescape(enabled_extensions=("html.jinja",), default_for_string=False),
+        auto_reload=False,
+        cache_size=-1,
+    )
+
+def load_environment() -> Environment:
+    """
+    Load the precompiled templates when present, otherwise compile from source
+    """
+    if os.path.isdir(COMPILED_TEMPLATES_DIR):
+        return create_environment(ModuleLoader(COMPILED_TEMPLATES_DIR))
+    return create_environment(FileSystemLoader(TEMPLATES_DIR))
+
+def compile_templates():
+    """
+    Compile every template to a Python module, run as a build step
+    """
+    create_environment(FileSystemLoader(TEMPLATES_DIR)).compile_templates(
+        COMPILED_TEMPLATES_DIR, zip=None, ignore_errors=False
+    )
+
+if __name__ == "__main__":
+    compile_templates()
@@ -0,0 +1,74 @@
+import os
+import hashlib
+import logging
+from typing import Optional
+from cachetools import TTLCache
+from dotenv import load_dotenv
+import redis.asyncio as redis
+
+logger = logging.getLogger('uvicorn.error')
+logger.setLevel(logging.DEBUG)
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Redis is optional, caching is skipped when REDIS_URL is not set
+REDIS_URL = os.environ.get("REDIS_URL")
+VERIFIED_EMAIL_TTL = 86400
+
+# Created on app startup, so every lifespan gets an open connection pool
+_redis: Optional[redis.Redis] = None
+
+# Recently verified emails in this process, checked before Redis so repeat
+# clicks on a confirmation link skip the network. Only touched from the event loop.
+_recently_verified: TTLCache = TTLCache(maxsize=10_000, ttl=300)
+
+def _verified_key(email: str) -> bytes:
+    """
+    Cache key for a verified email, hashed so addresses are not stored in Redis
+    """
+    return b"v:" + hashlib.sha256(email.encode()).digest()
+
+async def is_email_verified(email: str) -> bool:
+    """
+    Check whether an email has recently been verified
+    """
+    if email in _recently_verified:
+        return True
+    if _redis is None:
+        return False
+    try:
+        verified = bool(await _redis.exists(_verified_key(email)))
+        if verified:
+            _recently_verified[email] = True
+        return verified
+    except redis.RedisError as e:
+        logger.warning("is_email_verified(): Redis lookup failed: %s", e)
+        return False
+
+async def mark_email_verified(email: str):
+    """
+    Remember that an email has been verified
+    """
+    _recently_verified[email] = True
+    if _redis is None:
+        return
+    try:
+        await _redis.setex(_verified_key(email), VERIFIED_EMAIL_TTL, b"1")
+    except redis.RedisError as e:
+        logger.warning("mark_email_verified(): Redis write failed: %s", e)
+
+def open_cache():
+    """
+    Create the Redis connection pool when REDIS_URL is set, called on app startup
+    """
+    global _redis
+    if REDIS_URL:
+        _redis = redis.Redis.from_url(REDIS_URL, decode_responses=False)
+
+async def close_cache():
+    """
+    Close the Redis connection pool, called on app shutdown
+    """
+    if _redis is not None:
+        await _redis.aclose()
@@ -1,14 +1,21 @@
 import logging
 from typing import Optional
-from pydantic import BaseModel, EmailStr, Field
-from datetime import datetime
-import pytz
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from datetime import datetime, timezone
 from uuid import UUID
 
 logger = logging.getLogger('uvicorn.error')
 logger.setLevel(logging.DEBUG)
 
+# Maximum rows sent to PostgREST in a single insert request
+INSERT_CHUNK_SIZE = 1000
+
+# Subscriber fields written on insert
+SUBSCRIBER_COLUMNS = frozenset({"first_name", "email", "postcode", "email_verified"})
+
 class NewsletterSubscriber(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     id: Optional[UUID] = None
     first_name: str
     email: EmailStr
@@ -16,54 +23,79 @@ class NewsletterSubscriber(BaseModel):
     subscribed_at: Optional[datetime] = None
     email_verified: bool = False
 
+class NewsletterBatchResult(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
+    id: Optional[UUID] = None
+    email: EmailStr
+    status: str
+
 class EmailVerificationRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     email: str
 
 class EmailVerificationResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     message: str
 
-def insert_newsletter_subscriber(supabase, subscriber: NewsletterSubscriber) -> dict:
+def _subscriber_row(subscriber: NewsletterSubscriber, subscribed_at: str) -> dict:
     """
-    Insert a new newsletter subscriber into the database
+    Build the newsletter_subscribers row for a subscriber
+    """
+    row = subscriber.model_dump(mode="json", include=SUBSCRIBER_COLUMNS)
+    row["subscribed_at"] = subscribed_at
+    return row
+
+async def insert_newsletter_subscriber(supabase, subscriber: NewsletterSubscriber) -> dict:
+    """
+    Insert a new newsletter subscriber into the database, returning None if already subscribed
+    """
+    rows = await insert_newsletter_subscribers(supabase, [subscriber])
+    return rows[0] if rows else None
+    
+async def insert_newsletter_subscribers(supabase, subscribers: list[NewsletterSubscriber]) -> list[dict]:
+    """
+    Insert newsletter subscribers into the database, one request per chunk of rows.
+    Emails that are already subscribed are skipped and left out of the returned rows.
+    Chunks are inserted separately, so a failure leaves earlier chunks in place.
     """
     try:
-        data_to_insert = {
-            "first_name": subscriber.first_name,
-            "email": subscriber.email,
-            "postcode": subscriber.postcode,
-            "subscribed_at": datetime.now(pytz.UTC).isoformat(),
-            "email_verified": subscriber.email_verified,
-        }
-        logger.debug(f"insert_newsletter_subscriber(): Data to insert: {data_to_insert}")
+        subscribed_at = datetime.now(timezone.utc).isoformat()
+        data_to_insert = [_subscriber_row(subscriber, subscribed_at) for subscriber in subscribers]
+        logger.debug("insert_newsletter_subscribers(): Inserting %d subscribers", len(data_to_insert))
         
-        response = supabase.table('newsletter_subscribers').insert(data_to_insert).execute()
+        inserted = []
+        for start in range(0, len(data_to_insert), INSERT_CHUNK_SIZE):
+            chunk = data_to_insert[start:start + INSERT_CHUNK_SIZE]
+            response = await supabase.table('newsletter_subscribers').upsert(chunk, on_conflict="email", ignore_duplicates=True).execute()
+            inserted.extend(response.data or [])
         
-        if response.data:
-            logger.info(f"insert_newsletter_subscriber(): Inserted data: {response.data[0]}")
-        else:
-            logger.warning("insert_newsletter_subscriber(): No data returned from insert operation.")
+        logger.info("insert_newsletter_subscribers(): Inserted %d subscribers, %d already subscribed", len(inserted), len(data_to_insert) - len(inserted))
         
-        return response.data[0] if response.data else None
+        return inserted
     except Exception as e:
-        logger.error(f"insert_newsletter_subscriber(): Error inserting newsletter subscriber: {str(e)}")   
-        raise Exception(f"Error inserting newsletter subscriber: {str(e)}")
-    
-def verify_newsletter_subscriber(supabase, verify_request: EmailVerificationRequest) -> bool:
+        logger.error("insert_newsletter_subscribers(): Error inserting newsletter subscribers: %s", e)
+        raise Exception(f"Error inserting newsletter subscribers: {str(e)}")
+
+async def verify_newsletter_subscriber(supabase, verify_request: EmailVerificationRequest) -> bool:
     """
     Verify a subscriber's email address
     """
     try:
         email = verify_request.email
-        response = supabase.table('newsletter_subscribers').update({
+        # Only the number of matched rows is needed, so skip returning them
+        response = await supabase.table('newsletter_subscribers').update({
             "email_verified": True
-        }).eq("email", email).execute()
+        }, count="exact", returning="minimal").eq("email", email).execute()
         
-        if response.data:
-            logger.info(f"verify_newsletter_subscriber(): Email {email} verified successfully.")
+        if response.count:
+            logger.info("verify_newsletter_subscriber(): Email %s verified successfully.", email)
             return True
         else:
-            logger.warning(f"verify_newsletter_subscriber(): No subscriber found with email {email}.")
+            logger.warning("verify_newsletter_subscriber(): No subscriber found with email %s.", email)
             return False
     except Exception as e:
-        logger.error(f"verify_newsletter_subscriber(): Error verifying email {email}: {str(e)}")
-        raise Exception(f"Error verifying email {email}: {str(e)}")
\ No newline at end of file
+        logger.error("verify_newsletter_subscriber(): Error verifying email %s: %s", email, e)
+        raise Exception(f"Error verifying email {email}: {str(e)}")
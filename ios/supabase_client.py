@@ -0,0 +1,37 @@
+import os
+import httpx
+from supabase import acreate_client, AsyncClient
+
+# HTTP connections each worker keeps to the Supabase REST API. This only bounds
+# the HTTP pool; Postgres connections are pooled by PostgREST on Supabase's side.
+SUPABASE_MAX_CONNECTIONS = int(os.environ.get("SUPABASE_MAX_CONNECTIONS", "100"))
+SUPABASE_MAX_KEEPALIVE_CONNECTIONS = 20
+SUPABASE_POOL_TIMEOUT = 30
+
+async def create_supabase() -> AsyncClient:
+    """
+    Create the Supabase client, built once on app startup and shared by every request
+    """
+    client = await acreate_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+
+    # Swap the default PostgREST session for one with a bounded HTTP/2 connection pool
+    session = client.postgrest.session
+    client.postgrest.session = httpx.AsyncClient(
+        base_url=session.base_url,
+        headers=session.headers,
+        timeout=httpx.Timeout(session.timeout.read, pool=SUPABASE_POOL_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=SUPABASE_MAX_CONNECTIONS,
+            max_keepalive_connections=SUPABASE_MAX_KEEPALIVE_CONNECTIONS
+        ),
+        follow_redirects=True,
+        http2=True,
+    )
+    await session.aclose()
+    return client
+
+async def close_supabase(client: AsyncClient):
+    """
+    Close the PostgREST connection pool, called on app shutdown
+    """
+    await client.postgrest.aclose()